@@ -1,27 +1,48 @@
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings
 import os
 
+from app.ocr_engines.base import ENGINE_REGISTRY
+
 
 class Settings(BaseSettings):
-    RAW_STORAGE_PATH: str = os.getenv("RAW_STORAGE_PATH", "./storage/raw")
-    PREPROCESSED_STORAGE_PATH: str = os.getenv("PREPROCESSED_STORAGE_PATH", "./storage/preprocessed")
-    OUTPUT_STORAGE_PATH: str = os.getenv("OUTPUT_STORAGE_PATH", "./storage/output")
-    MLFLOW_TRACKING_URI: str = os.getenv("MLFLOW_TRACKING_URI", "")
+    RAW_STORAGE_PATH: str = "./storage/raw"
+    PREPROCESSED_STORAGE_PATH: str = "./storage/preprocessed"
+    OUTPUT_STORAGE_PATH: str = "./storage/output"
+    MLFLOW_TRACKING_URI: str = ""
 
     # vLLM
-    VLLM_BASE_URL: str = os.getenv("VLLM_BASE_URL", "http://vllm:8001")
-    VLLM_MODEL_NAME: str = os.getenv("VLLM_MODEL_NAME", "lightonai/LightOnOCR-2-1B")
+    VLLM_BASE_URL: str = "http://vllm:8001"
+    VLLM_MODEL_NAME: str = "lightonai/LightOnOCR-2-1B"
 
     # File validation
-    ALLOWED_EXTENSIONS: set[str] = {"pdf", "png", "jpg", "jpeg"}
+    ALLOWED_EXTENSIONS: frozenset[str] = frozenset({"pdf", "png", "jpg", "jpeg"})
     MAX_FILE_SIZE_MB: int = 50
+    MAX_PDF_PAGES: int = 500
+    MAX_IMAGE_DIMENSION: int = 10000  # max image / rendered page area is MAX_IMAGE_DIMENSION ** 2 pixels
+
+    # Pipeline
+    OCR_BATCH_SIZE: int = 8
+    OCR_BATCH_MAX_WAIT_MS: int = 200
+    MAX_OCR_WORKERS: int = 8
+    SAVE_PREPROCESSED_IMAGES: bool = True
+    OCR_CACHE_ENTRIES: int = 128
 
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Parse environment / .env once and return the shared Settings instance."""
+    return Settings()
+
+
+settings = get_settings()
 
-# Ensure storage directories exist
+# Ensure storage directories exist, including one subdirectory per registered engine
 for path in (settings.RAW_STORAGE_PATH, settings.PREPROCESSED_STORAGE_PATH, settings.OUTPUT_STORAGE_PATH):
     os.makedirs(path, exist_ok=True)
+    for engine_key in ENGINE_REGISTRY:
+        os.makedirs(os.path.join(path, engine_key), mode=0o700, exist_ok=True)
@@ -1,17 +1,65 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from app.routers import router
+from app.ocr_engines.base import DEFAULT_ENGINE, get_ocr_engine
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records never leave the process, so there is no need to pre-format
+        # or strip them for pickling on the caller's thread.
+        return record
+
+
+def setup_logging(level: int = logging.INFO) -> None:
+    """
+    Configure root logging so that request handlers only enqueue records.
+
+    Formatting and writing to stderr happen on a background listener thread,
+    keeping stream I/O and its handler lock off the request path.
+    """
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+
+    listener.start()
+    atexit.register(listener.stop)
+
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+setup_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Load the default engine up front so the first request doesn't pay for the import
+    engine = get_ocr_engine(DEFAULT_ENGINE)
+    yield
+    # Close pooled connections cleanly on shutdown
+    await engine.aclose()
+
 
 app = FastAPI(
     title="OCR Microservice",
     description="A production-ready OCR microservice supporting multiple engines.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.include_router(router)
@@ -1,7 +1,9 @@
+import asyncio
 import numpy as np
 from abc import ABC, abstractmethod
 import logging
 import importlib
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -19,18 +21,41 @@ DEFAULT_ENGINE = "lighton"
 class OCREngine(ABC):
     """Abstract base class for all OCR engines."""
 
+    # Set to True if the engine works as well on single-channel images;
+    # pages are then converted to grayscale at the end of preprocessing.
+    wants_grayscale: bool = False
+
     @abstractmethod
-    def infer(self, image: np.ndarray) -> str:
+    async def infer(self, image: np.ndarray) -> str:
         """Run OCR inference on a single image and return extracted text."""
         pass
 
+    async def infer_batch(self, images: list[np.ndarray]) -> list[str]:
+        """
+        Run OCR inference on several images and return texts in the same order.
+
+        The default issues all `infer` calls concurrently; engines with a native
+        batch API can override this.
+        """
+        return list(await asyncio.gather(*(self.infer(image) for image in images)))
+
+    async def aclose(self) -> None:
+        """Release resources held by the engine (connections, clients). Called at shutdown."""
+        pass
+
+    def is_error_text(self, text: str) -> bool:
+        """Return True if `text` is an error placeholder rather than real OCR output."""
+        return False
+
 
+@lru_cache(maxsize=None)
 def get_ocr_engine(engine_name: str) -> OCREngine:
     """
     Factory function that lazily imports and instantiates the requested OCR engine.
     
     This avoids loading heavy ML models (torch, transformers) until they are actually needed,
     and keeps each engine isolated in its own module.
+    Engines are process-lifetime singletons, so the result is cached per engine name.
     """
     engine_key = engine_name.lower()
 
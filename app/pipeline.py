@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from collections.abc import Callable, Iterator
+from concurrent.futures import Executor
+
+import numpy as np
+
+from app.config import settings
+from app.ocr_engines.base import OCREngine
+
+logger = logging.getLogger(__name__)
+
+RAW_QUEUE_SIZE = 4  # rendered pages waiting for preprocessing
+OCR_QUEUE_SIZE = 8  # preprocessed pages waiting for OCR
+
+# End-of-stream marker passed through the queues
+_DONE = None
+
+
+async def run_page_pipeline(
+    pages: Iterator[np.ndarray],
+    preprocess: Callable[[np.ndarray], np.ndarray],
+    ocr_engine: OCREngine,
+    executor: Executor,
+    preprocess_workers: int,
+    on_preprocessed: Callable[[int, np.ndarray], None] | None = None,
+) -> list[str]:
+    """
+    Render, preprocess and OCR pages as three concurrent stages.
+
+    Stages are connected by bounded queues, so rendering the next page,
+    preprocessing the current ones and OCR on earlier ones overlap. OCR runs
+    in batches of OCR_BATCH_SIZE, or whatever has arrived once
+    OCR_BATCH_MAX_WAIT_MS has passed. Returns the extracted texts in page order.
+    """
+    loop = asyncio.get_running_loop()
+    raw_queue: asyncio.Queue = asyncio.Queue(maxsize=RAW_QUEUE_SIZE)
+    ocr_queue: asyncio.Queue = asyncio.Queue(maxsize=OCR_QUEUE_SIZE)
+    results: dict[int, str] = {}
+
+    async def _render() -> None:
+        page_number = 0
+        while (img := await asyncio.to_thread(next, pages, None)) is not None:
+            page_number += 1
+            await raw_queue.put((page_number, img))
+        for _ in range(preprocess_workers):
+            await raw_queue.put(_DONE)
+
+    async def _preprocess_worker() -> None:
+        while (item := await raw_queue.get()) is not _DONE:
+            page_number, img = item
+            logger.info("Page %d — preprocessing...", page_number)
+            processed_img = await loop.run_in_executor(executor, preprocess, img)
+            if on_preprocessed is not None:
+                on_preprocessed(page_number, processed_img)
+            await ocr_queue.put((page_number, processed_img))
+
+    async def _preprocess() -> None:
+        workers = [asyncio.create_task(_preprocess_worker()) for _ in range(preprocess_workers)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # gather() doesn't cancel the remaining workers when one of them fails
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        await ocr_queue.put(_DONE)
+
+    async def _ocr() -> None:
+        batch_size = settings.OCR_BATCH_SIZE
+        max_wait = settings.OCR_BATCH_MAX_WAIT_MS / 1000
+        finished = False
+
+        while not finished and (item := await ocr_queue.get()) is not _DONE:
+            batch = [item]
+            deadline = loop.time() + max_wait
+            while len(batch) < batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(ocr_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _DONE:
+                    finished = True
+                    break
+                batch.append(item)
+
+            page_numbers = [page_number for page_number, _ in batch]
+            logger.info("Pages %s — running OCR...", page_numbers)
+            texts = await ocr_engine.infer_batch([img for _, img in batch])
+            results.update(zip(page_numbers, texts))
+
+    tasks = [asyncio.create_task(stage) for stage in (_render(), _preprocess(), _ocr())]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # If one stage failed, stop the others instead of leaving them blocked on a queue
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return [results[page_number] for page_number in sorted(results)]
@@ -1,3 +1,4 @@
+import cv2
 import numpy as np
 from abc import ABC, abstractmethod
 import pytesseract
@@ -8,7 +9,8 @@ logger = logging.getLogger(__name__)
 
 class Preprocessor(ABC):
     @abstractmethod
-    def process(self, image: np.ndarray) -> np.ndarray:
+    def process(self, image: np.ndarray, grayscale: bool = False) -> np.ndarray:
+        """Preprocess an RGB page; with `grayscale=True` return a single-channel image."""
         pass
 
 class DefaultPreprocessor(Preprocessor):
@@ -24,13 +26,15 @@ class DefaultPreprocessor(Preprocessor):
             return 0
         return 0
 
-    def process(self, image: np.ndarray) -> np.ndarray:
+    def process(self, image: np.ndarray, grayscale: bool = False) -> np.ndarray:
         angle = self.detect_rotation(image)
         if angle != 0:
-            logger.info(f"Rotating image by {angle} degrees")
+            logger.info("Rotating image by %d degrees", angle)
             pil_img = Image.fromarray(image)
             # PIL rotate is counter-clockwise. To rotate clockwise by `angle`, we use `-angle`.
             # expand=True ensures the image dimensions are adjusted to fit the rotated image.
             rotated_img = pil_img.rotate(-angle, expand=True)
-            return np.array(rotated_img)
+            image = np.asarray(rotated_img)
+        if grayscale:
+            return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
         return image
@@ -1,67 +1,113 @@
+import io
 import os
 import time
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-import aiofiles
-from fastapi import APIRouter, UploadFile, File, Form
-from fastapi.responses import FileResponse
-from PIL import Image
+import numpy as np
+from fastapi import APIRouter, BackgroundTasks, HTTPException, UploadFile, File, Form
+from fastapi.responses import Response
 
+from app.cache import LRUCache
+from app.config import settings
 from app.models import OCRResponse
 from app.utils import (
     validate_file,
-    save_upload_file,
+    stream_and_validate,
     file_to_images,
     build_storage_paths,
+    generate_secure_filename,
     build_markdown_output,
+    content_disposition,
+    write_file,
+    save_png_preview,
 )
+from app.pipeline import run_page_pipeline
 from app.preprocessing.base import DefaultPreprocessor
 from app.ocr_engines.base import get_ocr_engine
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Worker threads for CPU-bound page work (Tesseract OSD, PNG encoding)
+_PAGE_WORKERS = min(os.cpu_count() or 1, settings.MAX_OCR_WORKERS)
+_page_pool = ThreadPoolExecutor(max_workers=_PAGE_WORKERS, thread_name_prefix="ocr-page")
+
+# Stateless, so a single instance is shared by all requests and worker threads
+_preprocessor = DefaultPreprocessor()
+
+# OCR results of recently processed documents, keyed by (engine, SHA-256 of the upload)
+_result_cache: LRUCache[list[str]] = LRUCache(settings.OCR_CACHE_ENTRIES)
+
 
 @router.post("/ocr")
 async def process_ocr(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     engine: str = Form("lighton"),
-) -> FileResponse:
+) -> Response:
     start_time = time.time()
 
     # 1. Validate input
     file_ext = validate_file(file)
-    paths = build_storage_paths(file.filename, engine)  # type: ignore[arg-type]
-
-    # 2. Save raw file
-    await save_upload_file(file, paths["raw_file"])
-
-    # 3. Convert to page images
-    images = file_to_images(paths["raw_file"], file_ext)
-    logger.info(f"{file.filename}: {len(images)} page(s) detected")
-
-    # 4. Preprocess + OCR per page
-    preprocessor = DefaultPreprocessor()
-    ocr_engine = get_ocr_engine(engine)
-    extracted_texts: list[str] = []
-
-    for i, img in enumerate(images, start=1):
-        logger.info(f"Page {i}/{len(images)} — preprocessing...")
-        processed_img = preprocessor.process(img)
-
-        # Save preprocessed image
-        prep_path = os.path.join(
-            paths["preprocessed_dir"],
-            f"{paths['base_filename']}_page_{i}.png",
+    engine = engine.lower()
+    try:
+        ocr_engine = get_ocr_engine(engine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    uuid_name, original_stem = generate_secure_filename(file.filename)  # type: ignore[arg-type]
+    paths = build_storage_paths(uuid_name, original_stem, engine)
+
+    # 2. Validate content and stream raw file to disk
+    file_size, file_hash = await stream_and_validate(file, paths["raw_file"], file_ext)
+    logger.info(f"{file.filename}: saved {file_size} bytes as {uuid_name} (sha256={file_hash})")
+
+    # 3-4. Render, preprocess and OCR pages as a concurrent pipeline
+    loop = asyncio.get_running_loop()
+
+    # Save preprocessed images in the background so they don't hold up OCR
+    save_futures = []
+
+    def _save_preprocessed(i: int, processed_img: np.ndarray) -> None:
+        prep_path = f"{paths['preprocessed_dir']}/{paths['storage_stem']}_page_{i}.png"
+        save_futures.append(
+            loop.run_in_executor(_page_pool, save_png_preview, processed_img, prep_path)
         )
-        Image.fromarray(processed_img).save(prep_path)
-
-        logger.info(f"Page {i}/{len(images)} — running OCR...")
-        text = ocr_engine.infer(processed_img)
-        extracted_texts.append(f"========== PAGE {i} ==========\n{text}")
-        logger.info(f"Page {i}/{len(images)} — done")
 
-    final_text = "\n\n".join(extracted_texts).strip()
+    cache_key = (engine, file_hash)
+    cached_texts = _result_cache.get(cache_key)
+    if cached_texts is not None:
+        logger.info(f"{file.filename}: identical document already processed, reusing OCR result")
+        texts = cached_texts
+    else:
+        try:
+            texts = await run_page_pipeline(
+                # Decode from the spooled upload rather than re-reading the copy just written
+                file_to_images(file.file, file_ext),
+                partial(_preprocessor.process, grayscale=ocr_engine.wants_grayscale),
+                ocr_engine,
+                executor=_page_pool,
+                preprocess_workers=_PAGE_WORKERS,
+                on_preprocessed=_save_preprocessed if settings.SAVE_PREPROCESSED_IMAGES else None,
+            )
+        finally:
+            # Previews are best-effort: a failed save must not mask the pipeline's own error
+            for result in await asyncio.gather(*save_futures, return_exceptions=True):
+                if isinstance(result, Exception):
+                    logger.error(f"Failed to save preprocessed image: {result}")
+        # Don't remember results that contain engine errors, so a retry runs OCR again
+        if not any(ocr_engine.is_error_text(text) for text in texts):
+            _result_cache.put(cache_key, texts)
+    logger.info(f"{file.filename}: {len(texts)} page(s) processed")
+
+    buf = io.StringIO()
+    for i, text in enumerate(texts, start=1):
+        buf.write(f"========== PAGE {i} ==========\n")
+        buf.write(text)
+        buf.write("\n\n")
+    final_text = buf.getvalue().strip()
     processing_time = time.time() - start_time
 
     # 5. Build response
@@ -70,30 +116,30 @@ async def process_ocr(
         ocr_model=engine,
         extracted_text=final_text,
         metadata={
-            "pages": str(len(images)),
+            "pages": str(len(texts)),
             "processing_time_seconds": f"{processing_time:.2f}",
-            "preprocessing_type": type(preprocessor).__name__,
+            "preprocessing_type": type(_preprocessor).__name__,
             "warnings": "None",
         },
     )
 
-    # 6. Save markdown output
+    # 6. Return markdown output; persist it after the response is sent
     md_content = build_markdown_output(
         filename=file.filename,  # type: ignore[arg-type]
         engine=engine,
         processing_time=processing_time,
-        page_count=len(images),
+        page_count=len(texts),
         extracted_text=final_text,
     )
-    async with aiofiles.open(paths["output_file"], "w") as f:
-        await f.write(md_content)
+    md_bytes = md_content.encode("utf-8")
+    background_tasks.add_task(write_file, paths["output_file"], md_bytes)
 
     logger.info(f"Completed {file.filename} | engine={engine} | {processing_time:.2f}s")
 
-    return FileResponse(
-        path=paths["output_file"],
+    return Response(
+        content=md_bytes,
         media_type="text/markdown",
-        filename=f"{paths['base_filename']}.md",
+        headers={"Content-Disposition": content_disposition(f"{paths['base_filename']}.md")},
     )
 
 
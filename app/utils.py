@@ -1,18 +1,65 @@
 import os
 import io
+import re
+import asyncio
+import hashlib
 import logging
+import threading
+import uuid
+import warnings
 from pathlib import Path
+from typing import BinaryIO
+from collections.abc import Iterator
+from urllib.parse import quote
 
-import aiofiles
+import cv2
 import numpy as np
 from fastapi import UploadFile, HTTPException
-from pdf2image import convert_from_path
+import pypdfium2 as pdfium
 from PIL import Image
 
 from app.config import settings
+from app.ocr_engines.base import ENGINE_REGISTRY
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Leading bytes of each supported file format
+_PREFIX_TO_MIME: dict[bytes, str] = {
+    b"%PDF": "application/pdf",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"\xff\xd8\xff": "image/jpeg",
+}
+_PREFIX_LENS: list[int] = sorted({len(prefix) for prefix in _PREFIX_TO_MIME}, reverse=True)
+
+EXTENSION_MIME_TYPES: dict[str, str] = {
+    "pdf": "application/pdf",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+}
+
+class _SafeFilenameTable(dict):
+    """str.translate table: keeps alphanumerics and '._-', replaces anything else with '_'."""
+
+    def __missing__(self, codepoint: int) -> str:
+        # Only reached for characters outside the precomputed Latin-1 range
+        char = chr(codepoint)
+        return char if char.isalnum() else "_"
+
+
+# Filename sanitizing: path separators are dropped, other unsafe characters become '_'
+_SAFE_FILENAME_TABLE = _SafeFilenameTable(
+    {c: (chr(c) if chr(c).isalnum() or chr(c) in "._-" else "_") for c in range(256)}
+)
+_SAFE_FILENAME_TABLE[ord("/")] = None
+_SAFE_FILENAME_TABLE[ord("\\")] = None
+_DOTDOT = re.compile(r"\.{2,}")
+
+# PDFium is not thread-safe: every call into it must hold this lock
+_PDFIUM_LOCK = threading.Lock()
+
 # ──────────────────────────────────────────────
 # File Validation
 # ──────────────────────────────────────────────
@@ -22,6 +69,17 @@ def get_file_extension(filename: str) -> str:
     return Path(filename).suffix.lstrip(".").lower()
 
 
+def sanitize_filename(filename: str) -> str:
+    """
+    Strip directory components and replace unsafe characters so the name is safe on disk.
+    Keeps letters, digits, '.', '_' and '-'; runs of dots become '_'.
+    """
+    name = Path(filename).name
+    name = _DOTDOT.sub("_", name)
+    name = name.translate(_SAFE_FILENAME_TABLE)
+    return name or "unnamed_file"
+
+
 def validate_file(file: UploadFile) -> str:
     """
     Validate uploaded file: name, extension, and size.
@@ -48,44 +106,193 @@ def validate_file(file: UploadFile) -> str:
     return ext
 
 
+def detect_mime_type(header: bytes) -> str | None:
+    """Identify a supported file type from its leading magic bytes."""
+    for n in _PREFIX_LENS:
+        mime_type = _PREFIX_TO_MIME.get(header[:n])
+        if mime_type:
+            return mime_type
+    return None
+
+
 # ──────────────────────────────────────────────
 # File I/O
 # ──────────────────────────────────────────────
 
-async def save_upload_file(upload_file: UploadFile, destination: str) -> str:
-    """Async chunked file save."""
-    os.makedirs(os.path.dirname(destination), exist_ok=True)
-    async with aiofiles.open(destination, "wb") as out_file:
-        while content := await upload_file.read(1024 * 1024):
-            await out_file.write(content)
-    return destination
+def _open_for_write(path: str) -> int:
+    """Open (create/truncate) a file for writing with owner-only permissions."""
+    return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+
+def _write_all(fd: int, data: bytes | memoryview) -> None:
+    """Write the whole buffer, looping over short writes."""
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def write_file(path: str, data: bytes) -> None:
+    """Write bytes to path in one go (blocking; scheduled as a background task after the response)."""
+    fd = _open_for_write(path)
+    try:
+        _write_all(fd, data)
+    finally:
+        os.close(fd)
+
+
+def save_png_preview(image: np.ndarray, path: str) -> None:
+    """Save a debug preview PNG with the fastest zlib level (blocking; run in an executor)."""
+    Image.fromarray(image).save(path, optimize=False, compress_level=1)
+
+
+def _stream_upload(src: BinaryIO, destination: str, ext: str) -> tuple[int, str]:
+    """
+    Copy the upload to destination chunk by chunk, validating as it goes.
+
+    The magic bytes are checked on the first chunk before anything is written,
+    the size limit is enforced mid-stream, and every chunk feeds a SHA-256 hash.
+    On any failure the partial file is removed.
+    """
+    max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+
+    src.seek(0)
+    chunk = src.read(UPLOAD_CHUNK_SIZE)
+    if detect_mime_type(chunk[:16]) != EXTENSION_MIME_TYPES.get(ext):
+        raise HTTPException(
+            status_code=400,
+            detail=f"File content does not match its '.{ext}' extension.",
+        )
+
+    hasher = hashlib.sha256()
+    total = 0
+    fd = _open_for_write(destination)
+    try:
+        while chunk:
+            total += len(chunk)
+            if total > max_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Maximum allowed size: {settings.MAX_FILE_SIZE_MB} MB.",
+                )
+            hasher.update(chunk)
+            _write_all(fd, chunk)
+            chunk = src.read(UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        os.close(fd)
+        os.unlink(destination)
+        raise
+    os.close(fd)
+
+    return total, hasher.hexdigest()
+
+
+async def stream_and_validate(upload_file: UploadFile, destination: str, ext: str) -> tuple[int, str]:
+    """
+    Validate the upload's content and stream it to destination in a single worker thread.
+    Returns (size in bytes, SHA-256 hex digest). The directory must already exist.
+    Raises HTTPException on validation failure.
+    """
+    return await asyncio.to_thread(_stream_upload, upload_file.file, destination, ext)
 
 
 # ──────────────────────────────────────────────
 # Image Conversion
 # ──────────────────────────────────────────────
 
-def pdf_to_images(pdf_path: str, dpi: int = 150) -> list[np.ndarray]:
-    """Convert PDF to list of numpy images (one per page)."""
-    pages = convert_from_path(pdf_path, dpi=dpi)
-    return [np.array(page) for page in pages]
+def pdf_to_images(source: str | bytes, dpi: int = 150) -> Iterator[np.ndarray]:
+    """
+    Render a PDF (path or in-memory bytes) page by page with PDFium,
+    yielding one RGB numpy image per page.
+    The page count and every page's rendered size are checked before anything is rendered.
+    """
+    scale = dpi / 72
+    max_pixels = settings.MAX_IMAGE_DIMENSION ** 2
+
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(source)
+        page_count = len(pdf)
+    try:
+        if page_count > settings.MAX_PDF_PAGES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"PDF has too many pages ({page_count}). Maximum allowed: {settings.MAX_PDF_PAGES}.",
+            )
+        with _PDFIUM_LOCK:
+            # Page sizes come from the page tree without loading or rasterizing the pages
+            page_sizes = [pdf.get_page_size(index) for index in range(page_count)]
+        for page_number, (width, height) in enumerate(page_sizes, start=1):
+            if (width * scale) * (height * scale) > max_pixels:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"PDF page {page_number} is too large to render at {dpi} DPI.",
+                )
+
+        for index in range(page_count):
+            with _PDFIUM_LOCK:
+                page = pdf[index]
+                bitmap = page.render(scale=scale, rev_byteorder=True)
+                image = bitmap.to_numpy()
+                page.close()
+            yield image
+    finally:
+        with _PDFIUM_LOCK:
+            pdf.close()
+
+
+def load_image_as_numpy(source: str | bytes) -> np.ndarray:
+    """
+    Load an image (path or in-memory bytes) and return as RGB numpy array.
+    Decoded with OpenCV (libjpeg-turbo / libpng), which releases the GIL while decoding.
+    Images larger than MAX_IMAGE_DIMENSION ** 2 pixels are rejected with 413
+    before decoding, the same limit applied to rendered PDF pages.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            data = f.read()
+    else:
+        data = source
 
+    # OpenCV has no decompression-bomb guard; read the dimensions from the header first.
+    # The area check below is the real limit, so PIL's lower warning threshold is silenced.
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            width, height = Image.open(io.BytesIO(data)).size
+    except Image.DecompressionBombError:
+        width = height = settings.MAX_IMAGE_DIMENSION + 1
+    if width * height > settings.MAX_IMAGE_DIMENSION ** 2:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image is too large to process. Maximum area: {settings.MAX_IMAGE_DIMENSION ** 2} pixels.",
+        )
 
-def load_image_as_numpy(file_path: str) -> np.ndarray:
-    """Load an image file and return as RGB numpy array."""
-    image = Image.open(file_path).convert("RGB")
-    return np.array(image)
+    # EXIF orientation is ignored, as with the previous PIL decoder; the preprocessor handles rotation
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        raise ValueError("Could not decode image data.")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
 
-def file_to_images(file_path: str, ext: str) -> list[np.ndarray]:
+def file_to_images(source: str | BinaryIO, ext: str) -> Iterator[np.ndarray]:
     """
-    Convert a raw file (PDF or image) to a list of numpy arrays.
+    Lazily convert a raw file (PDF or image) to numpy arrays.
+    `source` is a path or a seekable binary file such as the spooled upload;
+    a file is read into memory once and decoded from bytes.
     Each element represents one page/image.
     """
     try:
+        if not isinstance(source, str):
+            # Plain read() rather than handing the file over: PDFium reads file objects via
+            # readinto(), which SpooledTemporaryFile lacks before Python 3.11
+            source.seek(0)
+            source = source.read()
         if ext == "pdf":
-            return pdf_to_images(file_path)
-        return [load_image_as_numpy(file_path)]
+            yield from pdf_to_images(source)
+        else:
+            yield load_image_as_numpy(source)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to convert file to images: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing file: {e}")
@@ -95,28 +302,58 @@ def file_to_images(file_path: str, ext: str) -> list[np.ndarray]:
 # Storage Path Builders
 # ──────────────────────────────────────────────
 
-def build_storage_paths(filename: str, engine: str) -> dict[str, str]:
+# (raw, preprocessed, output) directories per registered engine, created by app.config at import
+_ENGINE_DIRS: dict[str, tuple[str, str, str]] = {
+    engine: (
+        os.path.join(settings.RAW_STORAGE_PATH, engine),
+        os.path.join(settings.PREPROCESSED_STORAGE_PATH, engine),
+        os.path.join(settings.OUTPUT_STORAGE_PATH, engine),
+    )
+    for engine in ENGINE_REGISTRY
+}
+
+
+def generate_secure_filename(filename: str) -> tuple[str, str]:
     """
-    Build all storage paths for a given file and engine.
-    Also ensures directories exist.
+    Return (storage name, original stem) for an uploaded file.
+    The storage name is a random UUID plus the validated extension, so user-controlled
+    text never reaches disk paths; the sanitized original stem is only used for display.
     """
-    base = Path(filename).stem
+    ext = get_file_extension(filename)
+    uuid_name = f"{uuid.uuid4().hex}.{ext}" if ext else uuid.uuid4().hex
+    original_stem = Path(sanitize_filename(filename)).stem
+    return uuid_name, original_stem
 
-    raw_dir = os.path.join(settings.RAW_STORAGE_PATH, engine)
-    preprocessed_dir = os.path.join(settings.PREPROCESSED_STORAGE_PATH, engine)
-    output_dir = os.path.join(settings.OUTPUT_STORAGE_PATH, engine)
 
-    for d in (raw_dir, preprocessed_dir, output_dir):
-        os.makedirs(d, exist_ok=True)
+def build_storage_paths(uuid_name: str, original_stem: str, engine: str) -> dict[str, str]:
+    """
+    Build all storage paths for a stored file and engine.
+    `engine` must be a registered engine key; its directories are created at startup.
+    """
+    storage_stem = uuid_name.partition(".")[0]
+    raw_dir, preprocessed_dir, output_dir = _ENGINE_DIRS[engine]
 
     return {
-        "raw_file": os.path.join(raw_dir, filename),
+        "raw_file": f"{raw_dir}/{uuid_name}",
         "preprocessed_dir": preprocessed_dir,
-        "output_file": os.path.join(output_dir, f"{base}.md"),
-        "base_filename": base,
+        "output_file": f"{output_dir}/{storage_stem}.md",
+        "storage_stem": storage_stem,
+        "base_filename": original_stem,
     }
 
 
+# ──────────────────────────────────────────────
+# Response Helpers
+# ──────────────────────────────────────────────
+
+def content_disposition(filename: str) -> str:
+    """Build an attachment Content-Disposition header, RFC 5987-encoding non-ASCII names."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
 # ──────────────────────────────────────────────
 # Markdown Output Builder
 # ──────────────────────────────────────────────